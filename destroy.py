@@ -1,99 +1,195 @@
 #!/usr/bin/env python3
 import boto3
+import functools
+import os
+import random
 import time
 import botocore
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 
 REGION = "us-east-1"
 STACK = "s3-file-manager"
 
-ec2 = boto3.client("ec2", region_name=REGION)
-elbv2 = boto3.client("elbv2", region_name=REGION)
-asg = boto3.client("autoscaling", region_name=REGION)
+# provision.py's re-run state file; removed after teardown so the next
+# provision starts fresh instead of reusing IDs of deleted resources.
+STATE_PATH = ".provision.state.json"
+
+# Adaptive mode handles Throttling/RequestLimitExceeded with jittered
+# backoff; retry() below stays only for dependency-ordering errors the
+# SDK will not retry. Pool sized above the fan_out worker count so
+# threads don't queue on the urllib3 default of 10 connections.
+CLIENT_CONFIG = Config(
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    max_pool_connections=32,
+)
+
+# One session so credential resolution runs once and the clients share it.
+session = boto3.session.Session(region_name=REGION)
+
+ec2 = session.client("ec2", config=CLIENT_CONFIG)
+elbv2 = session.client("elbv2", config=CLIENT_CONFIG)
+asg = session.client("autoscaling", config=CLIENT_CONFIG)
+rgt = session.client("resourcegroupstaggingapi", config=CLIENT_CONFIG)
 
 # ---------- Helpers ----------
-def retry(msg, fn, delay=15):
-    while True:
+# Dependency-ordering errors worth waiting out; anything else raises
+# immediately (throttling is already handled by the adaptive Config).
+RETRYABLE_CODES = frozenset({"DependencyViolation", "ResourceInUse", "ResourceInUseException"})
+
+def retry(msg, fn, base=1.0, cap=30.0, max_attempts=12):
+    # Exponential backoff with full jitter, so parallel deletes don't
+    # all wake up and hammer the API at the same instant.
+    for attempt in range(max_attempts):
         try:
             fn()
             return
         except botocore.exceptions.ClientError as e:
-            if "DependencyViolation" in str(e) or "ResourceInUse" in str(e):
-                print(f"   {msg} — waiting...")
-                time.sleep(delay)
-            else:
+            code = e.response.get("Error", {}).get("Code", "")
+            if code not in RETRYABLE_CODES:
                 raise
-
-def has_stack_tag(obj):
-    return any(t["Key"] == "stack" and t["Value"] == STACK for t in obj.get("Tags", []))
+            if attempt == max_attempts - 1:
+                raise
+            backoff = random.uniform(0, min(cap, base * 2 ** attempt))
+            print(f"   {msg} — retrying in {backoff:.1f}s...")
+            time.sleep(backoff)
+
+def stack_arns(*resource_types):
+    """ARNs of stack-tagged resources, filtered server-side instead of describe-everything."""
+    arns = []
+    for page in rgt.get_paginator("get_resources").paginate(
+        ResourceTypeFilters=list(resource_types),
+        TagFilters=[{"Key": "stack", "Values": [STACK]}],
+    ):
+        arns.extend(m["ResourceARN"] for m in page["ResourceTagMappingList"])
+    return arns
+
+def fan_out(fn, items):
+    """Run fn over items concurrently; category ordering stays the outer barrier."""
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        return list(ex.map(fn, items))
 
 # ---------- ASG ----------
 print("🧨 Deleting Auto Scaling Groups")
-for g in asg.describe_auto_scaling_groups()["AutoScalingGroups"]:
-    if has_stack_tag(g):
-        name = g["AutoScalingGroupName"]
-        print("  ASG:", name)
-        asg.update_auto_scaling_group(AutoScalingGroupName=name, MinSize=0, MaxSize=0, DesiredCapacity=0)
-        time.sleep(20)
-        asg.delete_auto_scaling_group(AutoScalingGroupName=name, ForceDelete=True)
+def delete_one_asg(arn):
+    name = arn.split("autoScalingGroupName/", 1)[1]
+    print("  ASG:", name)
+    # ForceDelete terminates the instances itself; no need to scale
+    # to zero first or guess how long the scale-in takes.
+    asg.delete_auto_scaling_group(AutoScalingGroupName=name, ForceDelete=True)
+
+fan_out(delete_one_asg, stack_arns("autoscaling:autoScalingGroup"))
 
 # ---------- NLB ----------
 print("🧨 Deleting Network Load Balancers")
-for lb in elbv2.describe_load_balancers()["LoadBalancers"]:
-    if STACK in lb["LoadBalancerName"]:
-        print("  NLB:", lb["LoadBalancerName"])
-        elbv2.delete_load_balancer(LoadBalancerArn=lb["LoadBalancerArn"])
-
-print("   Waiting for NLBs to release ENIs...")
-time.sleep(60)
+def delete_one_lb(arn):
+    print("  NLB:", arn.split("/")[-2])
+    elbv2.delete_load_balancer(LoadBalancerArn=arn)
+    return arn
+
+deleted_lb_arns = fan_out(delete_one_lb, stack_arns("elasticloadbalancing:loadbalancer"))
+
+if deleted_lb_arns:
+    print("   Waiting for NLBs to be deleted...")
+    elbv2.get_waiter("load_balancers_deleted").wait(
+        LoadBalancerArns=deleted_lb_arns,
+        WaiterConfig={"Delay": 5, "MaxAttempts": 24},
+    )
+
+    # The waiter only covers the LB record; its ENIs can linger a few
+    # more seconds and block SG/subnet deletion, so poll until gone.
+    print("   Waiting for NLB ENIs to release...")
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        enis = ec2.describe_network_interfaces(
+            Filters=[{"Name": "description", "Values": [f"ELB net/{STACK}-nlb/*"]}]
+        )["NetworkInterfaces"]
+        if not enis:
+            break
+        time.sleep(2)
 
 # ---------- Target Groups ----------
 print("🧨 Deleting Target Groups")
-for tg in elbv2.describe_target_groups()["TargetGroups"]:
-    if STACK in tg["TargetGroupName"]:
-        print("  TG:", tg["TargetGroupName"])
-        retry("TG busy", lambda: elbv2.delete_target_group(TargetGroupArn=tg["TargetGroupArn"]))
+def delete_one_tg(arn):
+    print("  TG:", arn.split("/")[-2])
+    retry("TG busy", functools.partial(elbv2.delete_target_group, TargetGroupArn=arn))
+
+fan_out(delete_one_tg, stack_arns("elasticloadbalancing:targetgroup"))
 
 # ---------- Launch Templates ----------
 print("🧨 Deleting Launch Templates")
-for lt in ec2.describe_launch_templates()["LaunchTemplates"]:
-    if STACK in lt["LaunchTemplateName"]:
-        print("  LT:", lt["LaunchTemplateName"])
-        ec2.delete_launch_template(LaunchTemplateId=lt["LaunchTemplateId"])
+def delete_one_lt(arn):
+    lt_id = arn.split("/")[-1]
+    print("  LT:", lt_id)
+    ec2.delete_launch_template(LaunchTemplateId=lt_id)
+
+fan_out(delete_one_lt, stack_arns("ec2:launch-template"))
 
 # ---------- Security Groups ----------
 print("🧨 Deleting Security Groups")
-for sg in ec2.describe_security_groups()["SecurityGroups"]:
-    if has_stack_tag(sg):
-        print("  SG:", sg["GroupId"])
-        retry("SG in use", lambda: ec2.delete_security_group(GroupId=sg["GroupId"]))
+def delete_one_sg(arn):
+    sg_id = arn.split("/")[-1]
+    print("  SG:", sg_id)
+    retry("SG in use", functools.partial(ec2.delete_security_group, GroupId=sg_id))
+
+fan_out(delete_one_sg, stack_arns("ec2:security-group"))
 
 # ---------- VPC ----------
 print("🧨 Deleting VPC and network")
-for vpc in ec2.describe_vpcs()["Vpcs"]:
-    if has_stack_tag(vpc):
-        vpc_id = vpc["VpcId"]
-        print("  VPC:", vpc_id)
-
-        # IGW
-        igws = ec2.describe_internet_gateways(Filters=[{"Name":"attachment.vpc-id","Values":[vpc_id]}])["InternetGateways"]
-        for igw in igws:
-            igw_id = igw["InternetGatewayId"]
-            print("   IGW:", igw_id)
-            retry("IGW detach blocked", lambda: ec2.detach_internet_gateway(InternetGatewayId=igw_id, VpcId=vpc_id))
-            retry("IGW delete blocked", lambda: ec2.delete_internet_gateway(InternetGatewayId=igw_id))
-
-        # Subnets
-        for s in ec2.describe_subnets(Filters=[{"Name":"vpc-id","Values":[vpc_id]}])["Subnets"]:
-            print("   Subnet:", s["SubnetId"])
-            retry("Subnet in use", lambda sid=s["SubnetId"]: ec2.delete_subnet(SubnetId=sid))
-
-        # Route Tables
-        for rt in ec2.describe_route_tables(Filters=[{"Name":"vpc-id","Values":[vpc_id]}])["RouteTables"]:
-            if not any(a.get("Main") for a in rt["Associations"]):
-                print("   Route Table:", rt["RouteTableId"])
-                retry("RT in use", lambda rid=rt["RouteTableId"]: ec2.delete_route_table(RouteTableId=rid))
-
-        # VPC
-        retry("VPC busy", lambda: ec2.delete_vpc(VpcId=vpc_id))
+vpc_ids = [arn.split("/")[-1] for arn in stack_arns("ec2:vpc")]
+
+# One bulk describe per resource type, bucketed by VPC, instead of
+# three per-VPC calls inside the loop.
+subnets_by_vpc, rts_by_vpc, igws_by_vpc = {}, {}, {}
+if vpc_ids:
+    for page in ec2.get_paginator("describe_subnets").paginate(
+            Filters=[{"Name": "vpc-id", "Values": vpc_ids}]):
+        for s in page["Subnets"]:
+            subnets_by_vpc.setdefault(s["VpcId"], []).append(s)
+    for page in ec2.get_paginator("describe_route_tables").paginate(
+            Filters=[{"Name": "vpc-id", "Values": vpc_ids}]):
+        for rt in page["RouteTables"]:
+            rts_by_vpc.setdefault(rt["VpcId"], []).append(rt)
+    for page in ec2.get_paginator("describe_internet_gateways").paginate(
+            Filters=[{"Name": "attachment.vpc-id", "Values": vpc_ids}]):
+        for igw in page["InternetGateways"]:
+            for att in igw["Attachments"]:
+                igws_by_vpc.setdefault(att["VpcId"], []).append(igw)
+
+def delete_one_vpc(vpc_id):
+    print("  VPC:", vpc_id)
+
+    # IGW
+    for igw in igws_by_vpc.get(vpc_id, []):
+        igw_id = igw["InternetGatewayId"]
+        print("   IGW:", igw_id)
+        retry("IGW detach blocked", functools.partial(ec2.detach_internet_gateway, InternetGatewayId=igw_id, VpcId=vpc_id))
+        retry("IGW delete blocked", functools.partial(ec2.delete_internet_gateway, InternetGatewayId=igw_id))
+
+    # Subnets
+    def delete_one_subnet(s):
+        print("   Subnet:", s["SubnetId"])
+        retry("Subnet in use", functools.partial(ec2.delete_subnet, SubnetId=s["SubnetId"]))
+
+    fan_out(delete_one_subnet, subnets_by_vpc.get(vpc_id, []))
+
+    # Route Tables
+    def delete_one_rt(rt):
+        print("   Route Table:", rt["RouteTableId"])
+        retry("RT in use", functools.partial(ec2.delete_route_table, RouteTableId=rt["RouteTableId"]))
+
+    fan_out(delete_one_rt, [
+        rt for rt in rts_by_vpc.get(vpc_id, [])
+        if not any(a.get("Main") for a in rt["Associations"])
+    ])
+
+    # VPC
+    retry("VPC busy", functools.partial(ec2.delete_vpc, VpcId=vpc_id))
+
+fan_out(delete_one_vpc, vpc_ids)
+
+if os.path.exists(STATE_PATH):
+    os.remove(STATE_PATH)
+    print("🧨 Removed", STATE_PATH)
 
 print("\n🔥 ALL STACK RESOURCES DESTROYED 🔥")
@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 
 import os
-import time
 import json
 import base64
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 # =========================
@@ -29,40 +33,108 @@ INSTANCE_PROFILE_NAME = None  # e.g. "my-ec2-instance-profile" or None
 
 USER_DATA = None
 
+# Encoded once here; identical for every launch template in a run.
+USER_DATA_B64 = base64.b64encode(USER_DATA.encode("utf-8")).decode("utf-8") if USER_DATA else None
+
+# IDs of created resources, persisted after every step so a failed run
+# can be re-run and pick up where it left off instead of re-creating
+# the whole stack. Delete the file (or run destroy.py) to start fresh.
+STATE_PATH = ".provision.state.json"
+
 
 # =========================
 # AWS clients
 # =========================
-ec2 = boto3.client("ec2", region_name=REGION)
-elbv2 = boto3.client("elbv2", region_name=REGION)
-autoscaling = boto3.client("autoscaling", region_name=REGION)
+# Adaptive mode = exponential backoff with jitter plus a client-side
+# token bucket, so throttled calls back off without hand-rolled loops.
+# Pool sized above the executor fan-out so threads don't queue on the
+# urllib3 default of 10 connections.
+CLIENT_CONFIG = Config(
+    retries={"max_attempts": 10, "mode": "adaptive"},
+    max_pool_connections=32,
+)
+
+# One session so credential resolution runs once and the clients share it.
+session = boto3.session.Session(region_name=REGION)
+
+ec2 = session.client("ec2", config=CLIENT_CONFIG)
+elbv2 = session.client("elbv2", config=CLIENT_CONFIG)
+autoscaling = session.client("autoscaling", config=CLIENT_CONFIG)
+
+
+# Tags every stack resource shares. The stack tag stays in each
+# TagSpecifications too so a mid-run failure leaves resources
+# discoverable by destroy.py; extra shared tags (owner, cost
+# allocation, ...) only need to be added here.
+SHARED_TAGS = [{"Key": "stack", "Value": NAME}]
 
 
 def tag_spec(resource_type: str, name: str):
     return [{
         "ResourceType": resource_type,
-        "Tags": [
-            {"Key": "Name", "Value": name},
-            {"Key": "stack", "Value": NAME},
-        ]
+        "Tags": [{"Key": "Name", "Value": name}] + SHARED_TAGS,
     }]
 
 
-def wait(msg: str, seconds: int = 2):
-    print(msg)
-    time.sleep(seconds)
-
-
-def pick_two_azs():
+@functools.lru_cache(maxsize=32)
+def validate_ami(ami_id: str):
+    # Fail fast before creating anything; a bad AMI discovered at
+    # create_launch_template leaves half a stack for destroy.py.
+    try:
+        images = ec2.describe_images(ImageIds=[ami_id])["Images"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code", "").startswith("InvalidAMIID"):
+            raise SystemExit(f"AMI {ami_id} not found in {REGION} (edit AMI_ID at top of file).")
+        raise
+    if not images:
+        raise SystemExit(f"AMI {ami_id} not found in {REGION} (edit AMI_ID at top of file).")
+    return images[0]
+
+
+@functools.lru_cache(maxsize=1)
+def available_azs():
+    # Stable for the lifetime of a run; cache so repeated steps don't
+    # burn Describe throttle budget on the same answer.
     azs = ec2.describe_availability_zones(
         Filters=[{"Name": "state", "Values": ["available"]}]
     )["AvailabilityZones"]
-    names = [a["ZoneName"] for a in azs]
+    return tuple(a["ZoneName"] for a in azs)
+
+
+def pick_two_azs():
+    names = available_azs()
     if len(names) < 2:
         raise RuntimeError("Need at least 2 AZs in this region.")
     return names[0], names[1]
 
 
+def load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH) as f:
+            return json.load(f)
+    return {}
+
+
+_state_lock = threading.Lock()
+
+
+def save_state(state):
+    with open(STATE_PATH, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def step(state, key, fn, *args):
+    """Run fn once and record its result; re-runs reuse the recorded value."""
+    if key not in state:
+        result = fn(*args)
+        with _state_lock:
+            state[key] = result
+            save_state(state)
+    else:
+        print(f"{key}: reusing {state[key]} from {STATE_PATH}")
+    return state[key]
+
+
 def create_vpc():
     resp = ec2.create_vpc(
         CidrBlock=VPC_CIDR,
@@ -113,10 +185,13 @@ def create_public_subnet(vpc_id: str, cidr: str, az: str, rt_id: str, idx: int):
     )["Subnet"]
     subnet_id = subnet["SubnetId"]
 
-    # Auto-assign public IPs (easy mode)
-    ec2.modify_subnet_attribute(SubnetId=subnet_id, MapPublicIpOnLaunch={"Value": True})
-
-    ec2.associate_route_table(SubnetId=subnet_id, RouteTableId=rt_id)
+    # The two follow-ups are independent — overlap their round-trips.
+    # Auto-assign public IPs (easy mode) + route table association.
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_map = ex.submit(ec2.modify_subnet_attribute, SubnetId=subnet_id, MapPublicIpOnLaunch={"Value": True})
+        f_assoc = ex.submit(ec2.associate_route_table, SubnetId=subnet_id, RouteTableId=rt_id)
+        f_map.result()
+        f_assoc.result()
 
     print(f"Subnet ({az}): {subnet_id}  CIDR={cidr}")
     return subnet_id
@@ -189,11 +264,9 @@ def create_nlb(subnet_ids):
     print(f"NLB DNS: {lb_dns}")
 
     # Wait until active
-    for _ in range(30):
-        desc = elbv2.describe_load_balancers(LoadBalancerArns=[lb_arn])["LoadBalancers"][0]
-        if desc["State"]["Code"] == "active":
-            break
-        wait("Waiting for NLB to become active...", 2)
+    print("Waiting for NLB to become active...")
+    waiter = elbv2.get_waiter("load_balancer_available")
+    waiter.wait(LoadBalancerArns=[lb_arn], WaiterConfig={"Delay": 5, "MaxAttempts": 40})
 
     return lb_arn, lb_dns
 
@@ -234,8 +307,8 @@ def create_launch_template(sg_id: str):
     if INSTANCE_PROFILE_NAME:
         data["IamInstanceProfile"] = {"Name": INSTANCE_PROFILE_NAME}
 
-    if USER_DATA:
-        data["UserData"] = base64.b64encode(USER_DATA.encode("utf-8")).decode("utf-8")
+    if USER_DATA_B64:
+        data["UserData"] = USER_DATA_B64
 
     resp = ec2.create_launch_template(
         LaunchTemplateName=lt_name,
@@ -269,27 +342,45 @@ def create_asg(lt_id: str, subnet_ids, tg_arn: str):
 
 
 def main():
-    if AMI_ID.startswith("ami-") is False or "x" in AMI_ID:
-        raise SystemExit("Edit AMI_ID at top of file (must be a real ami-...).")
-
-    az1, az2 = pick_two_azs()
-    print(f"Using AZs: {az1}, {az2}")
-
-    vpc_id = create_vpc()
-    igw_id = create_igw(vpc_id)
-    rt_id = create_route_table(vpc_id, igw_id)
+    validate_ami(AMI_ID)
 
-    subnet1 = create_public_subnet(vpc_id, PUBLIC_SUBNET_CIDRS[0], az1, rt_id, 0)
-    subnet2 = create_public_subnet(vpc_id, PUBLIC_SUBNET_CIDRS[1], az2, rt_id, 1)
+    state = load_state()
 
-    sg_id = create_ec2_sg(vpc_id)
-
-    tg_arn = create_target_group(vpc_id)
-    lb_arn, lb_dns = create_nlb([subnet1, subnet2])
-    create_nlb_listener_tcp_443(lb_arn, tg_arn)
+    az1, az2 = step(state, "azs", pick_two_azs)
+    print(f"Using AZs: {az1}, {az2}")
 
-    lt_id = create_launch_template(sg_id)
-    asg_name = create_asg(lt_id, [subnet1, subnet2], tg_arn)
+    vpc_id = step(state, "vpc_id", create_vpc)
+    igw_id = step(state, "igw_id", create_igw, vpc_id)
+    rt_id = step(state, "rt_id", create_route_table, vpc_id, igw_id)
+
+    # Fan out independent creations; boto3 clients are thread-safe,
+    # so each batch only costs the slowest call in it.
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        f_subnet1 = ex.submit(step, state, "subnet1", create_public_subnet, vpc_id, PUBLIC_SUBNET_CIDRS[0], az1, rt_id, 0)
+        f_subnet2 = ex.submit(step, state, "subnet2", create_public_subnet, vpc_id, PUBLIC_SUBNET_CIDRS[1], az2, rt_id, 1)
+        f_sg = ex.submit(step, state, "ec2_sg", create_ec2_sg, vpc_id)
+        f_tg = ex.submit(step, state, "target_group_arn", create_target_group, vpc_id)
+
+        subnet1 = f_subnet1.result()
+        subnet2 = f_subnet2.result()
+        sg_id = f_sg.result()
+
+        f_nlb = ex.submit(step, state, "nlb", create_nlb, [subnet1, subnet2])
+        f_lt = ex.submit(step, state, "launch_template_id", create_launch_template, sg_id)
+
+        tg_arn = f_tg.result()
+        lb_arn, lb_dns = f_nlb.result()
+        lt_id = f_lt.result()
+
+    step(state, "listener_arn", create_nlb_listener_tcp_443, lb_arn, tg_arn)
+    asg_name = step(state, "asg_name", create_asg, lt_id, [subnet1, subnet2], tg_arn)
+
+    # Apply the shared tag set to all EC2-side resources in one call
+    # (create_tags takes up to 1000 IDs) instead of N re-tag calls.
+    ec2.create_tags(
+        Resources=[vpc_id, igw_id, rt_id, subnet1, subnet2, sg_id, lt_id],
+        Tags=SHARED_TAGS,
+    )
 
     print("\n✅ DONE")
     print(json.dumps({